@@ -0,0 +1,29 @@
+import time
+
+_started = time.perf_counter()
+
+from ._optional import import_times, timed_import
+
+# подмодули загружаются при первом обращении: market_ca.ca_logic, market_ca.metrics, ...
+SUBMODULES = ('ca_logic', 'cell', 'checkpoint', 'demand_field', 'density', 'event_log', 'listeners',
+              'live_state', 'metrics', 'path_planning', 'queues', 'random_walk', 'scenario',
+              'sparse_map', 'steady_state', 'stream_server', 'units')
+
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        return timed_import('.' + name, __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(SUBMODULES))
+
+
+def import_report() -> str:
+    lines = ['{:<16}{:>10.2f} ms'.format(name, seconds * 1000)
+             for name, seconds in sorted(import_times.items(), key=lambda item: -item[1])]
+    return '\n'.join(lines)
+
+
+import_times['market_ca'] = time.perf_counter() - _started
@@ -0,0 +1,29 @@
+import importlib.util
+import sys
+import time
+
+# время первой загрузки подмодулей пакета и необязательных зависимостей, в секундах;
+# для подмодулей в него входит и загрузка их собственных импортов. Прямой
+# import market_ca.ca_logic сюда не попадает, его время показывает python -X importtime
+import_times = {}
+
+_modules = {}
+
+
+def timed_import(name, package=None):
+    loaded = importlib.util.resolve_name(name, package) in sys.modules
+    started = time.perf_counter()
+    module = importlib.import_module(name, package)
+    if not loaded:
+        import_times.setdefault(name.lstrip('.'), time.perf_counter() - started)
+    return module
+
+
+def optional_import(name):
+    # необязательная зависимость загружается при первом использовании; None, если её нет
+    if name not in _modules:
+        try:
+            _modules[name] = timed_import(name)
+        except ImportError:
+            _modules[name] = None
+    return _modules[name]
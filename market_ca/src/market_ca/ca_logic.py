@@ -1,15 +1,21 @@
 import random
 
-from src.market_ca.cell import Cell
-from src.market_ca.units import *
+from .cell import Cell
+from .sparse_map import ChunkedMap
+from .units import MapUnit, Company, Product, Client
 
 UNIT_TYPE = {'Company': 0, 'Product': 1, 'Client': 2}
+EMPTY_CELL = 3
+UNIT_COLOR = {UNIT_TYPE['Company']: 'red', UNIT_TYPE['Product']: 'green', UNIT_TYPE['Client']: 'blue',
+              EMPTY_CELL: 'white'}
 COMPANY_START_RESOURCE = 50
 PRODUCT_START_RESOURCE = 20
 CLIENT_START_RESOURCE = 25
 
 
-def create_map(rows, columns):
+def create_map(rows, columns, tile_size=None):
+    if tile_size is not None:
+        return ChunkedMap(rows, columns, tile_size)
     return [[Cell() for _ in range(columns)] for _ in range(rows)]
 
 
@@ -28,14 +34,47 @@ def get_unit(unit_type, row_num, col_num):
         return Client(row_num, col_num, CLIENT_START_RESOURCE)
 
 
+def place_units(the_map, companies=(), products=(), clients=()):
+    for units in (companies, products, clients):
+        for unit in units:
+            cell = the_map[unit.row][unit.col]
+            if cell.unit is not None:
+                raise ValueError("Cell ({}, {}) is already occupied!".format(unit.row, unit.col))
+            cell.unit = unit
+
+    MapUnit.existing_units.companies.extend(companies)
+    MapUnit.existing_units.products.extend(products)
+    MapUnit.existing_units.clients.extend(clients)
+    if MapUnit.listeners:
+        for units in (companies, products, clients):
+            for unit in units:
+                for listener in MapUnit.listeners:
+                    listener.on_spawn(unit)
+
+
 def get_color_unit(unit):
+    return UNIT_COLOR[get_unit_type(unit)]
+
+
+def get_unit_type(unit):
     if isinstance(unit, Company):
-        return 'red'
+        return UNIT_TYPE['Company']
     elif isinstance(unit, Client):
-        return 'blue'
+        return UNIT_TYPE['Client']
     elif isinstance(unit, Product):
-        return 'green'
-    return 'white'
+        return UNIT_TYPE['Product']
+    return EMPTY_CELL
+
+
+def get_type_grid(rows, columns) -> bytearray:
+    # строится по реестрам юнитов, а не обходом карты
+    grid = bytearray([EMPTY_CELL]) * (rows * columns)
+    for unit_type, units in ((UNIT_TYPE['Company'], MapUnit.existing_units.companies),
+                             (UNIT_TYPE['Product'], MapUnit.existing_units.products),
+                             (UNIT_TYPE['Client'], MapUnit.existing_units.clients)):
+        for unit in units:
+            grid[unit.row * columns + unit.col] = unit_type
+    return grid
 
 
 def get_symbol_unit(unit):
@@ -55,16 +94,26 @@ def is_exists(unit, the_map):
     return True
 
 
-def handle_unit_actions(the_map: list):
+def handle_unit_actions(the_map: list, planner=None, random_walk=None):
     for client in MapUnit.existing_units.clients[:]:
         if is_exists(client, the_map):
             client.buy_product(the_map)
+    if planner is not None:
+        planner.plan(the_map)
     for company in MapUnit.existing_units.companies[:]:
         if is_exists(company, the_map):
             company.do_action(the_map)
-    for product in MapUnit.existing_units.products[:]:
+    products = MapUnit.existing_units.products[:]
+    if random_walk is not None:
+        undirected = [product for product in products if product.direction is None]
+        products = [product for product in products if product.direction is not None]
+    for product in products:
         if is_exists(product, the_map):
             product.do_action(the_map)
+    if random_walk is not None:
+        random_walk.step(the_map, undirected)
+    for listener in MapUnit.listeners:
+        listener.on_tick_end(the_map)
 
 
 def check_game_status():
@@ -73,11 +122,52 @@ def check_game_status():
     return None
 
 
+def play_tick(the_map: list, remaining_iterations, detector=None, planner=None, random_walk=None):
+    # один ход run_game: сколько ходов прошло (с перемоткой) и статус игры, если она закончилась
+    game_status = check_game_status()
+    if game_status is None and detector is not None:
+        game_status = detector.status()
+    if game_status is not None:
+        return 0, game_status
+
+    handle_unit_actions(the_map, planner, random_walk)
+    ticks = 1
+    if detector is not None:
+        ticks += detector.fast_forward(remaining_iterations - 1)
+    return ticks, None
+
+
+def run_game(the_map: list, max_iterations, detector=None, planner=None, random_walk=None):
+    iteration = 0
+    while iteration < max_iterations:
+        ticks, game_status = play_tick(the_map, max_iterations - iteration, detector, planner, random_walk)
+        if game_status is not None:
+            return iteration, game_status
+        iteration += ticks
+    return iteration, None
+
+
 def clear_objects(the_map: list):
     for unit in MapUnit.existing_units.companies[:]:
         unit.drop_unit(the_map)
     for unit in MapUnit.existing_units.clients[:]:
         unit.drop_unit(the_map)
+    Product.free_products.clear()
+    if isinstance(the_map, ChunkedMap):
+        the_map.close()
+
+
+def reset_units(previous_map=None):
+    # перед загрузкой нового состояния: старая карта очищается с событиями on_drop,
+    # а наблюдатели за старыми юнитами к новому состоянию не подходят
+    stale_listeners = [listener for listener in MapUnit.listeners if listener is not previous_map]
+    if stale_listeners:
+        raise ValueError("Close unit listeners before loading a new market state!")
+    if previous_map is not None:
+        clear_objects(previous_map)
+    for units in MapUnit.existing_units:
+        units.clear()
+    Product.free_products.clear()
 
 
 def get_total_number_units():
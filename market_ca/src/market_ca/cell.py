@@ -1,7 +1,8 @@
-from src.market_ca.units import MapUnit
+from .units import MapUnit
 
 
 class Cell:
+    __slots__ = ('_unit',)
     PRICE_PER_MOVE = 5
 
     def __init__(self, unit=None):
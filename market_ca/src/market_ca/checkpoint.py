@@ -0,0 +1,249 @@
+import mmap
+import random
+import struct
+from array import array
+
+from .ca_logic import create_map, get_type_grid, place_units, reset_units
+from .queues import Queue, DemandQueue
+from .units import MapUnit, Company, Product, Client
+
+MAGIC = b'MCACKPT2'
+BYTE_ORDER_MARK = 0x01020304
+NO_DIRECTION = -1
+
+# magic, метка порядка байт, rows, columns, число компаний, точек продаж,
+# продуктов, шагов путей, клиентов, наличие gauss_next, gauss_next
+_HEADER = struct.Struct('=8sIIIIIIIIId')
+_ALIGN = 8
+
+# (имя, код типа array, имя счётчика в заголовке, множитель длины)
+_SECTIONS = (
+    ('grid', 'B', 'cells', 1),
+    ('company_row', 'i', 'companies', 1),
+    ('company_col', 'i', 'companies', 1),
+    ('company_resource', 'q', 'companies', 1),
+    ('sale_point_offsets', 'i', 'companies_plus_one', 1),
+    ('sale_points', 'i', 'sale_points', 4),
+    ('product_row', 'i', 'products', 1),
+    ('product_col', 'i', 'products', 1),
+    ('product_resource', 'q', 'products', 1),
+    ('product_company', 'i', 'products', 1),
+    ('product_direction', 'i', 'products', 2),
+    ('path_offsets', 'i', 'products_plus_one', 1),
+    ('path_steps', 'i', 'path_steps', 2),
+    ('client_row', 'i', 'clients', 1),
+    ('client_col', 'i', 'clients', 1),
+    ('client_resource', 'q', 'clients', 1),
+    ('random_state', 'I', 'random_state', 1),
+)
+
+_RANDOM_STATE_SIZE = 625
+
+
+def _padding(size):
+    return -size % _ALIGN
+
+
+def _section_lengths(counts):
+    lengths = {}
+    for name, _, counter, multiplier in _SECTIONS:
+        lengths[name] = counts[counter] * multiplier
+    return lengths
+
+
+def _counts(rows, columns, companies, sale_points, products, path_steps, clients):
+    return {'cells': rows * columns,
+            'companies': companies,
+            'companies_plus_one': companies + 1,
+            'sale_points': sale_points,
+            'products': products,
+            'products_plus_one': products + 1,
+            'path_steps': path_steps,
+            'clients': clients,
+            'random_state': _RANDOM_STATE_SIZE}
+
+
+def save_checkpoint(path, the_map: list):
+    rows = len(the_map)
+    columns = len(the_map[0])
+    companies = MapUnit.existing_units.companies
+    products = MapUnit.existing_units.products
+    clients = MapUnit.existing_units.clients
+
+    sections = {name: array(typecode) for name, typecode, _, _ in _SECTIONS}
+    sections['grid'] = array('B', get_type_grid(rows, columns))
+
+    company_index = {}
+    sections['sale_point_offsets'].append(0)
+    for index, company in enumerate(companies):
+        company_index[id(company)] = index
+        sections['company_row'].append(company.row)
+        sections['company_col'].append(company.col)
+        sections['company_resource'].append(company.resource)
+        for hotspot in company.sale_points.state():
+            sections['sale_points'].extend(hotspot)
+        sections['sale_point_offsets'].append(len(sections['sale_points']) // 4)
+
+    sections['path_offsets'].append(0)
+    for product in products:
+        if id(product.company) not in company_index:
+            raise ValueError("Product at ({}, {}) has no company!".format(product.row, product.col))
+        sections['product_row'].append(product.row)
+        sections['product_col'].append(product.col)
+        sections['product_resource'].append(product.resource)
+        sections['product_company'].append(company_index[id(product.company)])
+        direction = product.direction if product.direction is not None else (NO_DIRECTION, NO_DIRECTION)
+        sections['product_direction'].extend(direction)
+        for row, column in product.path.elements:
+            sections['path_steps'].extend((row, column))
+        sections['path_offsets'].append(len(sections['path_steps']) // 2)
+
+    for client in clients:
+        sections['client_row'].append(client.row)
+        sections['client_col'].append(client.col)
+        sections['client_resource'].append(client.resource)
+
+    _, random_state, gauss_next = random.getstate()
+    sections['random_state'].extend(random_state)
+
+    header = _HEADER.pack(MAGIC, BYTE_ORDER_MARK, rows, columns,
+                          len(companies), len(sections['sale_points']) // 4,
+                          len(products), len(sections['path_steps']) // 2,
+                          len(clients), gauss_next is not None,
+                          gauss_next if gauss_next is not None else 0.0)
+
+    with open(path, 'wb') as file:
+        file.write(header)
+        file.write(bytes(_padding(len(header))))
+        for name, _, _, _ in _SECTIONS:
+            data = sections[name]
+            file.write(data)
+            file.write(bytes(_padding(len(data) * data.itemsize)))
+
+
+class Checkpoint:
+    def __init__(self, path):
+        self.sections = {}
+        self._buffer = None
+        self._mmap = None
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("File is not a market checkpoint!")
+        self._buffer = memoryview(self._mmap)
+
+        if len(self._buffer) < _HEADER.size:
+            self.close()
+            raise ValueError("File is not a market checkpoint!")
+        (magic, byte_order, self.rows, self.columns, companies, sale_points,
+         products, path_steps, clients, has_gauss, gauss_next) = _HEADER.unpack_from(self._buffer)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("File is not a market checkpoint!")
+        if byte_order != BYTE_ORDER_MARK:
+            self.close()
+            raise ValueError("Checkpoint was written with a different byte order!")
+        self.gauss_next = gauss_next if has_gauss else None
+
+        lengths = _section_lengths(_counts(self.rows, self.columns, companies, sale_points,
+                                           products, path_steps, clients))
+        sizes = {name: lengths[name] * array(typecode).itemsize for name, typecode, _, _ in _SECTIONS}
+        # обрезанный файл отклоняется до restore: срез за концом буфера просто был бы короче
+        expected_size = _HEADER.size + _padding(_HEADER.size)
+        expected_size += sum(size + _padding(size) for size in sizes.values())
+        file_size = len(self._buffer)
+        if file_size < expected_size:
+            self.close()
+            raise ValueError("Checkpoint is truncated: {} of {} bytes!".format(file_size, expected_size))
+
+        offset = _HEADER.size + _padding(_HEADER.size)
+        for name, typecode, _, _ in _SECTIONS:
+            size = sizes[name]
+            self.sections[name] = self._buffer[offset:offset + size].cast(typecode)
+            offset += size + _padding(size)
+
+    def __getitem__(self, name):
+        return self.sections[name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        for view in self.sections.values():
+            view.release()
+        self.sections = {}
+        if self._buffer is not None:
+            self._buffer.release()
+            self._buffer = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def restore(self, restore_random_state=True, tile_size=None, previous_map=None) -> list:
+        reset_units(previous_map)
+
+        the_map = create_map(self.rows, self.columns, tile_size)
+
+        companies = [Company.build(row, column, resource)
+                     for row, column, resource in zip(self['company_row'],
+                                                      self['company_col'],
+                                                      self['company_resource'])]
+        offsets = self['sale_point_offsets']
+        points = self['sale_points']
+        for index, company in enumerate(companies):
+            company.sale_points = _build_demand_queue(points, offsets[index], offsets[index + 1])
+
+        products = [Product.build(row, column, resource)
+                    for row, column, resource in zip(self['product_row'],
+                                                     self['product_col'],
+                                                     self['product_resource'])]
+        offsets = self['path_offsets']
+        steps = self['path_steps']
+        directions = self['product_direction']
+        for index, (product, company_index) in enumerate(zip(products, self['product_company'])):
+            company = companies[company_index]
+            product.company = company
+            company.company_products.append(product)
+            direction = (directions[2 * index], directions[2 * index + 1])
+            product.direction = direction if direction[0] != NO_DIRECTION else None
+            product.path = _build_queue(steps, offsets[index], offsets[index + 1])
+
+        clients = [Client.build(row, column, resource)
+                   for row, column, resource in zip(self['client_row'],
+                                                    self['client_col'],
+                                                    self['client_resource'])]
+
+        place_units(the_map, companies, products, clients)
+
+        if restore_random_state:
+            random.setstate((3, tuple(self['random_state']), self.gauss_next))
+        return the_map
+
+
+def _build_queue(coordinates, start, end):
+    queue = Queue()
+    queue.elements.extend(zip(coordinates[2 * start:2 * end:2], coordinates[2 * start + 1:2 * end:2]))
+    return queue
+
+
+def _build_demand_queue(hotspots, start, end):
+    queue = DemandQueue()
+    for index in range(start, end):
+        row, column, weight, age = hotspots[4 * index:4 * index + 4]
+        queue.elements.append([row, column, weight, -age])
+    return queue
+
+
+def load_checkpoint(path) -> Checkpoint:
+    return Checkpoint(path)
+
+
+def restore_checkpoint(path, restore_random_state=True, tile_size=None, previous_map=None) -> list:
+    with Checkpoint(path) as checkpoint:
+        return checkpoint.restore(restore_random_state, tile_size, previous_map)
@@ -0,0 +1,77 @@
+from array import array
+
+from ._optional import optional_import
+from .listeners import UnitListener
+from .units import MapUnit
+
+
+class DemandField(UnitListener):
+    # поле спроса: покупки добавляют спрос в точке продажи, каждый ход поле
+    # затухает и расплывается на соседние ячейки; одна ячейка поля покрывает
+    # квадрат resolution x resolution клеток карты
+    def __init__(self, the_map: list, resolution=1, deposit=1.0, decay=0.9, diffusion=0.2, use_numpy=True):
+        self.resolution = resolution
+        self.rows = -(-len(the_map) // resolution)
+        self.columns = -(-len(the_map[0]) // resolution)
+        self.deposit = deposit
+        self.decay = decay
+        self.diffusion = diffusion
+        self._numpy = optional_import('numpy') if use_numpy else None
+        self.use_numpy = self._numpy is not None
+        self.values = array('d', bytes(8 * self.rows * self.columns))
+        MapUnit.listeners.append(self)
+        MapUnit.demand_field = self
+
+    def close(self):
+        if self in MapUnit.listeners:
+            MapUnit.listeners.remove(self)
+        if MapUnit.demand_field is self:
+            MapUnit.demand_field = None
+
+    def value(self, position):
+        row, column = position
+        return self.values[(row // self.resolution) * self.columns + column // self.resolution]
+
+    def state(self):
+        return self.values.tobytes()
+
+    def best_positions(self, positions) -> list:
+        best_value = max(self.value(position) for position in positions)
+        return [position for position in positions if self.value(position) == best_value]
+
+    def on_buy(self, client, product):
+        row = product.row // self.resolution
+        column = product.col // self.resolution
+        self.values[row * self.columns + column] += self.deposit
+
+    def on_tick_end(self, the_map):
+        if self.use_numpy:
+            self._numpy_step()
+        else:
+            self._python_step()
+
+    def _python_step(self):
+        values = self.values
+        rows = self.rows
+        columns = self.columns
+        keep = self.decay * (1 - self.diffusion)
+        spread = self.decay * self.diffusion / 4
+        new_values = array('d', values)
+        for row in range(rows):
+            up = (row - 1 if row > 0 else row) * columns
+            down = (row + 1 if row < rows - 1 else row) * columns
+            here = row * columns
+            for column in range(columns):
+                left = column - 1 if column > 0 else column
+                right = column + 1 if column < columns - 1 else column
+                new_values[here + column] = keep * values[here + column] + spread * (
+                    values[up + column] + values[down + column] + values[here + left] + values[here + right])
+        self.values = new_values
+
+    def _numpy_step(self):
+        numpy = self._numpy
+        grid = numpy.frombuffer(self.values, dtype=numpy.float64).reshape(self.rows, self.columns)
+        padded = numpy.pad(grid, 1, mode='edge')
+        neighbours = padded[:-2, 1:-1] + padded[2:, 1:-1] + padded[1:-1, :-2] + padded[1:-1, 2:]
+        new_grid = self.decay * ((1 - self.diffusion) * grid + self.diffusion / 4 * neighbours)
+        self.values = array('d', new_grid.tobytes())
@@ -0,0 +1,94 @@
+from array import array
+
+from .listeners import UnitListener
+from .units import MapUnit, Product
+
+
+class CountTree:
+    # двумерное дерево Фенвика: добавление и сумма по прямоугольнику за O(log² n)
+    __slots__ = ('rows', 'columns', 'tree')
+
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+        self.tree = array('i', bytes(4 * (rows + 1) * (columns + 1)))
+
+    def add(self, row, column, value):
+        tree = self.tree
+        width = self.columns + 1
+        row += 1
+        while row <= self.rows:
+            index = column + 1
+            while index <= self.columns:
+                tree[row * width + index] += value
+                index += index & -index
+            row += row & -row
+
+    def prefix(self, row, column):
+        # сумма по [0, row] x [0, column]
+        tree = self.tree
+        width = self.columns + 1
+        total = 0
+        row += 1
+        while row > 0:
+            index = column + 1
+            while index > 0:
+                total += tree[row * width + index]
+                index -= index & -index
+            row -= row & -row
+        return total
+
+    def count(self, start_row, end_row, start_col, end_col):
+        total = self.prefix(end_row, end_col)
+        if start_row > 0:
+            total -= self.prefix(start_row - 1, end_col)
+        if start_col > 0:
+            total -= self.prefix(end_row, start_col - 1)
+        if start_row > 0 and start_col > 0:
+            total += self.prefix(start_row - 1, start_col - 1)
+        return total
+
+
+class DensityIndex(UnitListener):
+    # число занятых клеток и продуктов в окне обзора без перебора клеток;
+    # клиент перебирает окно, только когда в нём точно есть продукт. Для поиска
+    # свободной клетки индекс не используется: она почти всегда есть, и запрос дороже перебора
+    def __init__(self, the_map: list):
+        rows = len(the_map)
+        columns = len(the_map[0])
+        self.occupied = CountTree(rows, columns)
+        self.products = CountTree(rows, columns)
+        for units in MapUnit.existing_units:
+            for unit in units:
+                self.on_spawn(unit)
+        MapUnit.listeners.append(self)
+        MapUnit.density = self
+
+    def close(self):
+        if self in MapUnit.listeners:
+            MapUnit.listeners.remove(self)
+        if MapUnit.density is self:
+            MapUnit.density = None
+
+    def has_free(self, bounds):
+        start_row, end_row, start_col, end_col = bounds
+        area = (end_row - start_row + 1) * (end_col - start_col + 1)
+        return self.occupied.count(start_row, end_row, start_col, end_col) < area
+
+    def has_products(self, bounds):
+        return self.products.count(*bounds) > 0
+
+    def _add(self, unit, row, column, value):
+        self.occupied.add(row, column, value)
+        if isinstance(unit, Product):
+            self.products.add(row, column, value)
+
+    def on_spawn(self, unit):
+        self._add(unit, unit.row, unit.col, 1)
+
+    def on_move(self, unit, old_position):
+        self._add(unit, old_position[0], old_position[1], -1)
+        self._add(unit, unit.row, unit.col, 1)
+
+    def on_drop(self, unit):
+        self._add(unit, unit.row, unit.col, -1)
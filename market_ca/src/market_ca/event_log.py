@@ -0,0 +1,273 @@
+import mmap
+import queue
+import threading
+import zlib
+from bisect import bisect_right
+
+from .ca_logic import EMPTY_CELL, get_type_grid, get_unit_type
+from .listeners import UnitListener
+from .units import MapUnit
+
+MAGIC = b'MCAEVLG1'
+
+KEYFRAME = ord('K')
+DELTA = ord('D')
+
+SPAWN = 1
+MOVE = 2
+PRODUCE = 3
+BUY = 4
+DROP = 5
+
+# число пар координат в событии каждого вида
+_EVENT_POSITIONS = {SPAWN: 1, MOVE: 2, PRODUCE: 2, BUY: 2, DROP: 1}
+
+
+def _write_varint(buffer: bytearray, value):
+    while value > 0x7f:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _zigzag(value):
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def _unzigzag(value):
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+class EventLog(UnitListener):
+    def __init__(self, path, the_map: list, keyframe_interval=100, max_pending=64):
+        self.rows = len(the_map)
+        self.columns = len(the_map[0])
+        self.keyframe_interval = keyframe_interval
+        self.tick = 0
+
+        self._events = bytearray()
+        self._last_position = (0, 0)
+
+        self._file = open(path, 'wb')
+        header = bytearray(MAGIC)
+        _write_varint(header, self.rows)
+        _write_varint(header, self.columns)
+        self._file.write(header)
+        self._file.flush()
+        # запись лога без потерь: если диск не успевает, очередь ограничивает память,
+        # а ход ждёт, пока освободится место; ошибка записи поднимается в потоке симуляции
+        self._pending = queue.Queue(max_pending)
+        self._error = None
+        self._writer = threading.Thread(target=self._write_chunks, daemon=True)
+        self._writer.start()
+
+        self._put_keyframe()
+        MapUnit.listeners.append(self)
+
+    def close(self):
+        if self in MapUnit.listeners:
+            MapUnit.listeners.remove(self)
+        if self._file.closed:
+            return
+        try:
+            if self._error is None:
+                self._put(None)
+            self._writer.join()
+        finally:
+            self._file.close()
+        self._check_writer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _check_writer(self):
+        if self._error is not None:
+            raise self._error
+
+    def _put(self, chunk):
+        while True:
+            self._check_writer()
+            try:
+                self._pending.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _write_chunks(self):
+        try:
+            while True:
+                chunk = self._pending.get()
+                if chunk is None:
+                    break
+                kind, tick, payload = chunk
+                if kind == KEYFRAME:
+                    payload = zlib.compress(payload)
+                header = bytearray([kind])
+                _write_varint(header, tick)
+                _write_varint(header, len(payload))
+                self._file.write(header)
+                self._file.write(payload)
+                # чанки становятся видны читателю, как только очередь разобрана
+                if self._pending.empty():
+                    self._file.flush()
+            self._file.flush()
+        except BaseException as error:
+            self._error = error
+
+    def _put_keyframe(self):
+        self._put((KEYFRAME, self.tick, get_type_grid(self.rows, self.columns)))
+        # после кадра дельты снова считаются от начала карты
+        self._last_position = (0, 0)
+
+    def _put_position(self, position):
+        row, column = position
+        last_row, last_column = self._last_position
+        _write_varint(self._events, _zigzag(row - last_row))
+        _write_varint(self._events, _zigzag(column - last_column))
+        self._last_position = position
+
+    def on_spawn(self, unit):
+        self._events.append(SPAWN)
+        self._events.append(get_unit_type(unit))
+        self._put_position((unit.row, unit.col))
+
+    def on_move(self, unit, old_position):
+        self._events.append(MOVE)
+        self._put_position(old_position)
+        self._put_position((unit.row, unit.col))
+
+    def on_produce(self, company, product):
+        self._events.append(PRODUCE)
+        self._put_position((company.row, company.col))
+        self._put_position((product.row, product.col))
+
+    def on_buy(self, client, product):
+        self._events.append(BUY)
+        self._put_position((client.row, client.col))
+        self._put_position((product.row, product.col))
+
+    def on_drop(self, unit):
+        self._events.append(DROP)
+        self._put_position((unit.row, unit.col))
+
+    def on_fast_forward(self, ticks):
+        self.tick += ticks
+
+    def on_tick_end(self, the_map):
+        self.tick += 1
+        self._put((DELTA, self.tick, bytes(self._events)))
+        self._events = bytearray()
+        self._last_position = (0, 0)
+        if self.tick % self.keyframe_interval == 0:
+            self._put_keyframe()
+
+
+class EventLogReader:
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("File is not a market event log!")
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("File is not a market event log!")
+
+        self.rows, offset = _read_varint(self._mmap, len(MAGIC))
+        self.columns, offset = _read_varint(self._mmap, offset)
+
+        self._deltas = {}
+        self._keyframe_ticks = []
+        self._keyframes = []
+        size = len(self._mmap)
+        while offset < size:
+            kind = self._mmap[offset]
+            try:
+                tick, offset = _read_varint(self._mmap, offset + 1)
+                length, offset = _read_varint(self._mmap, offset)
+            except IndexError:
+                break  # заголовок чанка не дописан до конца
+            if offset + length > size:
+                break  # чанк не дописан до конца
+            if kind == KEYFRAME:
+                self._keyframe_ticks.append(tick)
+                self._keyframes.append((offset, length))
+            else:
+                self._deltas[tick] = (offset, length)
+            offset += length
+
+        # у только что открытого лога может не быть ни одного кадра
+        self.last_tick = max(max(self._keyframe_ticks, default=0), max(self._deltas, default=0))
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def events(self, tick) -> list:
+        if tick not in self._deltas:
+            return []
+        offset, length = self._deltas[tick]
+        end = offset + length
+        data = self._mmap
+        last_row, last_column = 0, 0
+        events = []
+        while offset < end:
+            code = data[offset]
+            offset += 1
+            event = [code]
+            if code == SPAWN:
+                event.append(data[offset])
+                offset += 1
+            for _ in range(_EVENT_POSITIONS[code]):
+                row, offset = _read_varint(data, offset)
+                column, offset = _read_varint(data, offset)
+                last_row += _unzigzag(row)
+                last_column += _unzigzag(column)
+                event.append((last_row, last_column))
+            events.append(tuple(event))
+        return events
+
+    def grid_at(self, tick) -> bytearray:
+        index = bisect_right(self._keyframe_ticks, tick) - 1
+        if index < 0:
+            raise ValueError("No keyframe before tick {}".format(tick))
+        offset, length = self._keyframes[index]
+        grid = bytearray(zlib.decompress(self._mmap[offset:offset + length]))
+        columns = self.columns
+
+        for replay_tick in range(self._keyframe_ticks[index] + 1, tick + 1):
+            for event in self.events(replay_tick):
+                code = event[0]
+                if code == SPAWN:
+                    row, column = event[2]
+                    grid[row * columns + column] = event[1]
+                elif code == MOVE:
+                    (old_row, old_column), (row, column) = event[1], event[2]
+                    grid[row * columns + column] = grid[old_row * columns + old_column]
+                    grid[old_row * columns + old_column] = EMPTY_CELL
+                elif code == DROP:
+                    row, column = event[1]
+                    grid[row * columns + column] = EMPTY_CELL
+        return grid
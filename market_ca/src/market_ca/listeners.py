@@ -0,0 +1,24 @@
+class UnitListener:
+    # наблюдатель за изменениями на карте, подключается через MapUnit.listeners
+
+    def on_spawn(self, unit):
+        pass
+
+    def on_move(self, unit, old_position):
+        pass
+
+    def on_produce(self, company, product):
+        pass
+
+    def on_buy(self, client, product):
+        pass
+
+    def on_drop(self, unit):
+        pass
+
+    def on_tick_end(self, the_map):
+        pass
+
+    def on_fast_forward(self, ticks):
+        # ходы пропущены перемоткой: ресурсы изменились без событий юнитов
+        pass
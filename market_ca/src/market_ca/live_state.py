@@ -0,0 +1,186 @@
+import struct
+import time
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+from .ca_logic import UNIT_TYPE, EMPTY_CELL, get_type_grid, get_unit_type
+from .listeners import UnitListener
+from .units import MapUnit
+
+MAGIC = b'MCALIVE1'
+
+# сигнатура, строки, столбцы, поколение, ход, число компаний, продуктов и клиентов
+_HEADER = struct.Struct('=8sIIQQQQQ')
+_UINT64 = struct.Struct('=Q')
+_GENERATION_OFFSET = 16
+_TICK_OFFSET = 24
+_COUNTS = struct.Struct('=QQQ')
+_COUNTS_OFFSET = 32
+GRID_OFFSET = 64
+
+LiveFrame = namedtuple('LiveFrame', ['generation', 'tick', 'counts', 'grid'])
+
+# блоки, созданные издателями этого процесса
+_published = set()
+
+
+class TypeGridTracker(UnitListener):
+    # сетка типов юнитов, которая обновляется по событиям, и номера изменённых клеток
+    def __init__(self, the_map: list):
+        self.rows = len(the_map)
+        self.columns = len(the_map[0])
+        self.grid = get_type_grid(self.rows, self.columns)
+        self.dirty = set()
+        MapUnit.listeners.append(self)
+
+    def close(self):
+        if self in MapUnit.listeners:
+            MapUnit.listeners.remove(self)
+
+    def _set(self, row, column, unit_type):
+        index = row * self.columns + column
+        self.grid[index] = unit_type
+        self.dirty.add(index)
+
+    def on_spawn(self, unit):
+        self._set(unit.row, unit.col, get_unit_type(unit))
+
+    def on_move(self, unit, old_position):
+        self._set(old_position[0], old_position[1], EMPTY_CELL)
+        self._set(unit.row, unit.col, get_unit_type(unit))
+
+    def on_drop(self, unit):
+        self._set(unit.row, unit.col, EMPTY_CELL)
+
+    def take_dirty(self):
+        dirty = self.dirty
+        self.dirty = set()
+        return dirty
+
+
+def _unit_counts():
+    counts = [0] * len(UNIT_TYPE)
+    counts[UNIT_TYPE['Company']] = len(MapUnit.existing_units.companies)
+    counts[UNIT_TYPE['Product']] = len(MapUnit.existing_units.products)
+    counts[UNIT_TYPE['Client']] = len(MapUnit.existing_units.clients)
+    return counts
+
+
+class LiveStatePublisher(TypeGridTracker):
+    # публикует сетку и счётчики в разделяемую память под seqlock:
+    # пока поколение нечётное, запись не закончена
+    def __init__(self, the_map: list, name=None, publish_interval=1):
+        super().__init__(the_map)
+        self.publish_interval = publish_interval
+        self.tick = 0
+        self.generation = 0
+        self._memory = shared_memory.SharedMemory(name=name, create=True,
+                                                  size=GRID_OFFSET + self.rows * self.columns)
+        self.name = self._memory.name
+        _published.add(self._memory._name)
+
+        _HEADER.pack_into(self._memory.buf, 0, MAGIC, self.rows, self.columns, 0, 0, 0, 0, 0)
+        self._publish(full=True)
+
+    def close(self):
+        super().close()
+        if self._memory is not None:
+            _published.discard(self._memory._name)
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def on_fast_forward(self, ticks):
+        self.tick += ticks
+        self._publish()
+
+    def on_tick_end(self, the_map):
+        self.tick += 1
+        if self.tick % self.publish_interval == 0:
+            self._publish()
+
+    def _set_generation(self, generation):
+        self.generation = generation
+        _UINT64.pack_into(self._memory.buf, _GENERATION_OFFSET, generation)
+
+    def _publish(self, full=False):
+        buf = self._memory.buf
+        dirty = self.take_dirty()
+        self._set_generation(self.generation + 1)
+        # при большом числе изменений дешевле скопировать сетку целиком
+        if full or len(dirty) * 8 > len(self.grid):
+            buf[GRID_OFFSET:GRID_OFFSET + len(self.grid)] = self.grid
+        else:
+            grid = self.grid
+            for index in dirty:
+                buf[GRID_OFFSET + index] = grid[index]
+        _UINT64.pack_into(buf, _TICK_OFFSET, self.tick)
+        _COUNTS.pack_into(buf, _COUNTS_OFFSET, *_unit_counts())
+        self._set_generation(self.generation + 1)
+
+
+class LiveStateReader:
+    def __init__(self, name):
+        try:
+            self._memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # до Python 3.13 трекер ресурсов удалил бы чужой блок при выходе читателя
+            self._memory = shared_memory.SharedMemory(name=name)
+            if self._memory._name not in _published:
+                resource_tracker.unregister(self._memory._name, 'shared_memory')
+
+        magic, self.rows, self.columns = _HEADER.unpack_from(self._memory.buf, 0)[:3]
+        if magic != MAGIC:
+            self._memory.close()
+            raise ValueError("Shared memory block {} is not a live market state!".format(name))
+        self._grid = self._memory.buf[GRID_OFFSET:GRID_OFFSET + self.rows * self.columns]
+
+    def close(self):
+        if self._memory is not None:
+            self._grid.release()
+            self._memory.close()
+            self._memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def generation(self):
+        return _UINT64.unpack_from(self._memory.buf, _GENERATION_OFFSET)[0]
+
+    def is_current(self, frame: LiveFrame):
+        return self.generation == frame.generation
+
+    def read(self, copy=True, timeout=1.0) -> LiveFrame:
+        # без копирования сетка остаётся видом на разделяемую память
+        # и верна, пока is_current(frame) возвращает True
+        buf = self._memory.buf
+        deadline = time.monotonic() + timeout
+        while True:
+            generation = self.generation
+            if generation % 2 == 0:
+                (tick,) = _UINT64.unpack_from(buf, _TICK_OFFSET)
+                counts = _COUNTS.unpack_from(buf, _COUNTS_OFFSET)
+                grid = bytes(self._grid) if copy else self._grid
+                if self.generation == generation:
+                    return LiveFrame(generation, tick, counts, grid)
+            if time.monotonic() > deadline:
+                raise TimeoutError("Live state is not published!")
+            time.sleep(0)
+
+    def wait_for_update(self, generation, timeout=None, poll_interval=0.01) -> LiveFrame:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.generation <= generation:
+            if deadline is not None and time.monotonic() > deadline:
+                return None
+            time.sleep(poll_interval)
+        return self.read()
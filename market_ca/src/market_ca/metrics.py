@@ -0,0 +1,189 @@
+import csv
+from array import array
+
+from .cell import Cell
+from .listeners import UnitListener
+from .units import MapUnit, Company, Product, Client
+
+
+class RingBuffer:
+    # последние size значений; при downsample > 1 в буфер попадает одно значение
+    # на каждые downsample добавленных, сведённое функцией aggregate
+    __slots__ = ('size', 'downsample', 'aggregate', 'appended',
+                 '_values', '_start', '_length', '_pending', '_pending_count')
+
+    AGGREGATES = ('last', 'mean', 'sum', 'max')
+
+    def __init__(self, size, downsample=1, aggregate='last', typecode='d'):
+        if aggregate not in self.AGGREGATES:
+            raise ValueError("Unknown aggregate: {}".format(aggregate))
+        self.size = size
+        self.downsample = downsample
+        self.aggregate = aggregate
+        self.appended = 0
+        self._values = array(typecode, [0]) * size
+        self._start = 0
+        self._length = 0
+        self._pending = 0
+        self._pending_count = 0
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        values = self._values
+        for index in range(self._length):
+            yield values[(self._start + index) % self.size]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("Ring buffer index out of range!")
+        return self._values[(self._start + index) % self.size]
+
+    @property
+    def last(self):
+        return self[-1] if self._length > 0 else None
+
+    def append(self, value):
+        self.appended += 1
+        if self.aggregate == 'last' or self._pending_count == 0:
+            self._pending = value
+        elif self.aggregate == 'max':
+            self._pending = max(self._pending, value)
+        else:
+            self._pending += value
+        self._pending_count += 1
+        if self._pending_count < self.downsample:
+            return
+
+        value = self._pending
+        if self.aggregate == 'mean':
+            value /= self._pending_count
+        self._pending = 0
+        self._pending_count = 0
+        if self._length < self.size:
+            self._values[(self._start + self._length) % self.size] = value
+            self._length += 1
+        else:
+            self._values[self._start] = value
+            self._start = (self._start + 1) % self.size
+
+    def values(self) -> list:
+        return list(self)
+
+    def clear(self):
+        self.appended = 0
+        self._start = 0
+        self._length = 0
+        self._pending = 0
+        self._pending_count = 0
+
+
+class MarketMetrics(UnitListener):
+    # счётчики обновляются по событиям юнитов, реестры обходятся только в resync
+    SERIES = ('tick', 'companies', 'products', 'clients', 'company_resources', 'sales')
+
+    def __init__(self, history=1024, downsample=1, lifetime_history=4096):
+        self.tick = 0
+        self.total_sales = 0
+        self.tick_sales = 0
+        self._spawn_ticks = {}
+
+        self.series = {
+            'tick': RingBuffer(history, downsample, 'last', 'q'),
+            'companies': RingBuffer(history, downsample, 'mean'),
+            'products': RingBuffer(history, downsample, 'mean'),
+            'clients': RingBuffer(history, downsample, 'mean'),
+            'company_resources': RingBuffer(history, downsample, 'mean'),
+            'sales': RingBuffer(history, downsample, 'sum', 'q'),
+        }
+        self.product_lifetimes = RingBuffer(lifetime_history, typecode='q')
+
+        self.resync()
+        MapUnit.listeners.append(self)
+
+    def close(self):
+        if self in MapUnit.listeners:
+            MapUnit.listeners.remove(self)
+
+    def resync(self):
+        # пересчёт по реестрам, если ресурсы менялись в обход событий
+        self.companies = len(MapUnit.existing_units.companies)
+        self.products = len(MapUnit.existing_units.products)
+        self.clients = len(MapUnit.existing_units.clients)
+        self.company_resources = sum(company.resource for company in MapUnit.existing_units.companies)
+        for product in MapUnit.existing_units.products:
+            self._spawn_ticks.setdefault(id(product), self.tick)
+
+    @property
+    def total_units(self):
+        return self.companies + self.products + self.clients
+
+    def on_spawn(self, unit):
+        if isinstance(unit, Company):
+            self.companies += 1
+            self.company_resources += unit.resource
+        elif isinstance(unit, Client):
+            self.clients += 1
+        elif isinstance(unit, Product):
+            self.products += 1
+            self._spawn_ticks[id(unit)] = self.tick
+
+    def on_produce(self, company, product):
+        self.company_resources -= Cell.PRICE_PER_MOVE
+
+    def on_buy(self, client, product):
+        self.tick_sales += 1
+        self.company_resources += Client.PRODUCT_PRICE
+
+    def on_drop(self, unit):
+        if isinstance(unit, Company):
+            self.companies -= 1
+            self.company_resources -= unit.resource
+        elif isinstance(unit, Client):
+            self.clients -= 1
+        elif isinstance(unit, Product):
+            self.products -= 1
+            spawn_tick = self._spawn_ticks.pop(id(unit), None)
+            if spawn_tick is not None:
+                self.product_lifetimes.append(self.tick - spawn_tick)
+
+    def on_tick_end(self, the_map):
+        self.tick += 1
+        self.total_sales += self.tick_sales
+        series = self.series
+        series['tick'].append(self.tick)
+        series['companies'].append(self.companies)
+        series['products'].append(self.products)
+        series['clients'].append(self.clients)
+        series['company_resources'].append(self.company_resources)
+        series['sales'].append(self.tick_sales)
+        self.tick_sales = 0
+
+    def on_fast_forward(self, ticks):
+        self.tick += ticks
+        self.resync()
+
+    def mean_product_lifetime(self):
+        if len(self.product_lifetimes) == 0:
+            return None
+        return sum(self.product_lifetimes) / len(self.product_lifetimes)
+
+    def summary(self) -> dict:
+        return {
+            'tick': self.tick,
+            'companies': self.companies,
+            'products': self.products,
+            'clients': self.clients,
+            'company_resources': self.company_resources,
+            'total_sales': self.total_sales,
+            'mean_product_lifetime': self.mean_product_lifetime(),
+        }
+
+    def export_csv(self, path):
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(self.SERIES)
+            writer.writerows(zip(*(self.series[name] for name in self.SERIES)))
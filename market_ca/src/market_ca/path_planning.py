@@ -0,0 +1,152 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from .ca_logic import EMPTY_CELL, get_type_grid
+from .queues import Queue
+from .units import MapUnit, Company, Product
+
+
+class GridWalker:
+    # поиск пути A* из MapUnit, но по снимку занятости вместо карты из Cell;
+    # радиус обзора передаётся с каждым пакетом, а не берётся при импорте
+    _get_visible_bounds = MapUnit._get_visible_bounds
+    _get_visible_pos = MapUnit._get_visible_pos
+    _a_star_search = MapUnit._a_star_search
+    _reconstruct_path = staticmethod(MapUnit._reconstruct_path)
+
+    def __init__(self, grid, rows, columns, radius_view):
+        self.grid = grid
+        self.rows = rows
+        self.columns = columns
+        self.RADIUS_VIEW = radius_view
+
+    def get_passable_pos(self, the_map, current_pos):
+        visible_pos = self._get_visible_pos(self.rows - 1, self.columns - 1, current_pos)
+        return [(row, column) for row, column in visible_pos
+                if self.grid[row * self.columns + column] == EMPTY_CELL]
+
+    def find_path(self, start_pos, goal_pos, resource):
+        came_from = self._a_star_search(None, start_pos, goal_pos, resource)
+        return self._reconstruct_path(came_from, start_pos, goal_pos)
+
+
+_attached = {}
+
+
+def _solve_batch(memory_name, rows, columns, radius_view, requests):
+    memory = _attached.get(memory_name)
+    if memory is None:
+        for old_memory in _attached.values():
+            old_memory.close()
+        _attached.clear()
+        memory = shared_memory.SharedMemory(name=memory_name)
+        _attached[memory_name] = memory
+    walker = GridWalker(memory.buf, rows, columns, radius_view)
+    return [walker.find_path(start_pos, goal_pos, resource) for start_pos, goal_pos, resource in requests]
+
+
+class PathPlanner:
+    def __init__(self, workers=None, min_batch=32, chunks_per_worker=4):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_batch = min_batch
+        self.chunks_per_worker = chunks_per_worker
+        self._pool = None
+        self._memory = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._memory is not None:
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _snapshot(self, rows, columns):
+        size = rows * columns
+        if self._memory is None or self._memory.size < size:
+            if self._memory is not None:
+                self._memory.close()
+                self._memory.unlink()
+            self._memory = shared_memory.SharedMemory(create=True, size=size)
+        self._memory.buf[:size] = get_type_grid(rows, columns)
+        return self._memory.buf
+
+    def _collect_requests(self, the_map):
+        owners = []
+        requests = []
+        # при поле спроса компании выбирают направление без точек продаж и пути
+        companies = MapUnit.existing_units.companies if MapUnit.demand_field is None else ()
+        for company in companies:
+            company.planned_route = None
+            if company.resource <= 0:
+                continue
+            if len(company.get_passable_pos(the_map, (company.row, company.col))) <= 0:
+                continue
+            direction = company.next_sale_point()
+            if direction is None:
+                # точки продаж уже состарены на этом ходу, do_action не должен делать это второй раз
+                company.planned_route = (None, None)
+            else:
+                owners.append((company, direction))
+                requests.append(((company.row, company.col), direction, Company.PRODUCT_RESOURCE))
+
+        for product in MapUnit.existing_units.products:
+            if product.resource <= 0 or product.direction is None:
+                continue
+            if (product.row, product.col) == product.direction:
+                continue
+            if not product.path.empty():
+                row, column = product.path.elements[0]
+                if the_map[row][column].unit is None:
+                    continue
+            owners.append((product, product.direction))
+            requests.append(((product.row, product.col), product.direction, product.resource))
+        return owners, requests
+
+    def _solve(self, rows, columns, requests):
+        radius_view = MapUnit.RADIUS_VIEW
+        if len(requests) < self.min_batch or self.workers <= 1:
+            walker = GridWalker(self._memory.buf, rows, columns, radius_view)
+            return [walker.find_path(*request) for request in requests]
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        chunk_size = -(-len(requests) // (self.workers * self.chunks_per_worker))
+        futures = [self._pool.submit(_solve_batch, self._memory.name, rows, columns, radius_view,
+                                     requests[start:start + chunk_size])
+                   for start in range(0, len(requests), chunk_size)]
+        paths = []
+        for future in futures:
+            paths.extend(future.result())
+        return paths
+
+    def plan(self, the_map: list):
+        rows = len(the_map)
+        columns = len(the_map[0])
+        owners, requests = self._collect_requests(the_map)
+        if len(requests) == 0:
+            return 0
+
+        self._snapshot(rows, columns)
+        paths = self._solve(rows, columns, requests)
+
+        for (unit, direction), path in zip(owners, paths):
+            if isinstance(unit, Product):
+                unit.path.reset()
+                unit.path_planned = True
+                if path is not None:
+                    unit.path.elements.extend(path)
+            else:
+                route = Queue()
+                if path is not None:
+                    route.elements.extend(path)
+                unit.planned_route = (direction, route)
+        return len(requests)
@@ -3,6 +3,8 @@ import collections
 
 
 class Queue:
+    __slots__ = ('elements',)
+
     def __init__(self):
         self.elements = collections.deque()
 
@@ -16,10 +18,12 @@ class Queue:
         return self.elements.popleft()
 
     def reset(self):
-        self.elements = collections.deque()
+        self.elements.clear()
 
 
 class PriorityQueue:
+    __slots__ = ('elements',)
+
     def __init__(self):
         self.elements = []
 
@@ -31,3 +35,58 @@ class PriorityQueue:
 
     def get(self):
         return heapq.heappop(self.elements)[1]
+
+
+class DemandQueue:
+    # точки продаж компании: соседние продажи сливаются в одну точку с весом,
+    # старые точки забываются, размер ограничен
+    __slots__ = ('elements', 'max_size', 'merge_radius', 'max_age', 'tick')
+
+    def __init__(self, max_size=8, merge_radius=1, max_age=20):
+        self.elements = []  # [row, column, weight, last_sale_tick]
+        self.max_size = max_size
+        self.merge_radius = merge_radius
+        self.max_age = max_age
+        self.tick = 0
+
+    def empty(self):
+        return len(self.elements) == 0
+
+    def put(self, x):
+        row, column = x
+        for hotspot in self.elements:
+            if abs(hotspot[0] - row) <= self.merge_radius and abs(hotspot[1] - column) <= self.merge_radius:
+                hotspot[0] = row
+                hotspot[1] = column
+                hotspot[2] += 1
+                hotspot[3] = self.tick
+                return
+        if len(self.elements) >= self.max_size:
+            self.elements.remove(min(self.elements, key=self._value))
+        self.elements.append([row, column, 1, self.tick])
+
+    def get(self, origin=None, max_distance=None):
+        candidates = self.elements
+        if origin is not None and max_distance is not None:
+            origin_row, origin_column = origin
+            candidates = [hotspot for hotspot in candidates
+                          if abs(hotspot[0] - origin_row) <= max_distance
+                          and abs(hotspot[1] - origin_column) <= max_distance]
+        if len(candidates) == 0:
+            return None
+        best = max(candidates, key=self._value)
+        self.elements.remove(best)
+        return best[0], best[1]
+
+    def age_out(self):
+        self.tick += 1
+        self.elements = [hotspot for hotspot in self.elements if self.tick - hotspot[3] <= self.max_age]
+
+    def reset(self):
+        self.elements.clear()
+
+    def state(self):
+        return tuple((row, column, weight, self.tick - last_sale) for row, column, weight, last_sale in self.elements)
+
+    def _value(self, hotspot):
+        return hotspot[2] / (1 + self.tick - hotspot[3])
@@ -0,0 +1,105 @@
+import random
+
+from ._optional import optional_import
+from .ca_logic import EMPTY_CELL, get_type_grid
+from .units import MapUnit
+
+
+class RandomWalkKernel:
+    # один шаг случайного блуждания сразу для всех продуктов без направления:
+    # цели выбираются по снимку карты, за одну клетку побеждает случайный претендент
+    def __init__(self, seed=None, use_numpy=True):
+        self._numpy = optional_import('numpy') if use_numpy else None
+        self.use_numpy = self._numpy is not None
+        if self.use_numpy:
+            self.rng = self._numpy.random.default_rng(seed)
+        else:
+            self.rng = random.Random(seed)
+        self._offsets = None
+
+    def step(self, the_map: list, candidates=None) -> int:
+        if candidates is None:
+            candidates = MapUnit.existing_units.products[:]
+        products = []
+        for product in candidates:
+            if product.direction is not None:
+                continue
+            if product.resource <= 0:
+                product.drop_unit(the_map)
+            else:
+                products.append(product)
+        if len(products) == 0:
+            return 0
+
+        if self.use_numpy and MapUnit.demand_field is None:
+            moves = self._numpy_moves(the_map, products)
+        else:
+            moves = self._python_moves(the_map, products)
+        for product, new_position in moves:
+            product.move(the_map, new_position)
+        return len(moves)
+
+    def _python_moves(self, the_map, products):
+        targets = []
+        for product in products:
+            passable_pos = product.get_passable_pos(the_map, (product.row, product.col))
+            if len(passable_pos) > 0:
+                if MapUnit.demand_field is not None:
+                    passable_pos = MapUnit.demand_field.best_positions(passable_pos)
+                targets.append((product, passable_pos[self.rng.randrange(len(passable_pos))]))
+        self.rng.shuffle(targets)
+
+        claimed = set()
+        moves = []
+        for product, new_position in targets:
+            if new_position not in claimed:
+                claimed.add(new_position)
+                moves.append((product, new_position))
+        return moves
+
+    def _numpy_moves(self, the_map, products):
+        numpy = self._numpy
+        rows = len(the_map)
+        columns = len(the_map[0])
+        radius = MapUnit.RADIUS_VIEW
+        if self._offsets is None or self._offsets[0] != radius:
+            row_offsets, column_offsets = [], []
+            for row_offset in range(-radius, radius + 1):
+                for column_offset in range(-radius, radius + 1):
+                    if row_offset != 0 or column_offset != 0:
+                        row_offsets.append(row_offset)
+                        column_offsets.append(column_offset)
+            self._offsets = (radius, numpy.array(row_offsets), numpy.array(column_offsets))
+        _, row_offsets, column_offsets = self._offsets
+
+        grid = numpy.frombuffer(get_type_grid(rows, columns), dtype=numpy.uint8)
+        product_rows = numpy.fromiter((product.row for product in products), dtype=numpy.int64, count=len(products))
+        product_columns = numpy.fromiter((product.col for product in products), dtype=numpy.int64, count=len(products))
+
+        # границы обзора считаются так же, как в MapUnit._get_visible_pos
+        start_rows = numpy.where(product_rows - radius >= 0, product_rows - radius, product_rows)
+        end_rows = numpy.where(product_rows + radius <= rows - 1, product_rows + radius, product_rows)
+        start_columns = numpy.where(product_columns - radius >= 0, product_columns - radius, product_columns)
+        end_columns = numpy.where(product_columns + radius <= columns - 1, product_columns + radius, product_columns)
+
+        target_rows = product_rows[:, None] + row_offsets[None, :]
+        target_columns = product_columns[:, None] + column_offsets[None, :]
+        visible = ((target_rows >= start_rows[:, None]) & (target_rows <= end_rows[:, None])
+                   & (target_columns >= start_columns[:, None]) & (target_columns <= end_columns[:, None]))
+        target_cells = numpy.where(visible, target_rows * columns + target_columns, 0)
+        free = visible & (grid[target_cells] == EMPTY_CELL)
+
+        free_counts = free.sum(axis=1)
+        movers = numpy.flatnonzero(free_counts > 0)
+        if len(movers) == 0:
+            return []
+        picks = (self.rng.random(len(movers)) * free_counts[movers]).astype(numpy.int64)
+        # номер выбранной свободной клетки -> номер смещения
+        choices = (numpy.cumsum(free[movers], axis=1) > picks[:, None]).argmax(axis=1)
+        chosen_cells = target_cells[movers, choices]
+
+        order = self.rng.permutation(len(movers))
+        _, first = numpy.unique(chosen_cells[order], return_index=True)
+        winners = order[first]
+
+        return [(products[movers[index]], divmod(int(chosen_cells[index]), columns)) for index in winners]
@@ -0,0 +1,168 @@
+import ast
+import csv
+import os
+import re
+import struct
+
+from ._optional import optional_import
+from .ca_logic import (UNIT_TYPE, EMPTY_CELL, COMPANY_START_RESOURCE, CLIENT_START_RESOURCE,
+                       create_map, get_type_grid, place_units, reset_units)
+from .units import Company, Client
+
+NPY_MAGIC = b'\x93NUMPY'
+_BYTE_DTYPES = ('|u1', '<u1', '>u1', '|i1', '<i1', '>i1')
+
+# продукты без компании-владельца на карту не ставятся
+SCENARIO_UNITS = {UNIT_TYPE['Company']: Company, UNIT_TYPE['Client']: Client}
+DEFAULT_RESOURCES = {UNIT_TYPE['Company']: COMPANY_START_RESOURCE,
+                     UNIT_TYPE['Client']: CLIENT_START_RESOURCE}
+
+
+def _check_unit_type(unit_type, allowed=()):
+    if unit_type in SCENARIO_UNITS or unit_type in allowed:
+        return unit_type
+    if unit_type in UNIT_TYPE.values():
+        raise ValueError("Unit type {} can not be placed by a scenario!".format(unit_type))
+    raise ValueError("Unknown unit type: {}".format(unit_type))
+
+
+def _unit_type(value):
+    value = value.strip()
+    return _check_unit_type(UNIT_TYPE[value] if value in UNIT_TYPE else int(value))
+
+
+def _read_npy(path):
+    numpy = optional_import('numpy')
+    if numpy is not None:
+        grid = numpy.load(path, mmap_mode='r')
+        if grid.dtype.str not in _BYTE_DTYPES or grid.ndim != 2:
+            raise ValueError("Scenario must be a 2D array of byte unit types!")
+        return grid
+
+    with open(path, 'rb') as file:
+        data = file.read()
+    if data[:len(NPY_MAGIC)] != NPY_MAGIC:
+        raise ValueError("File is not a .npy array!")
+    major_version = data[6]
+    if major_version == 1:
+        (header_length,) = struct.unpack_from('<H', data, 8)
+        offset = 10
+    else:
+        (header_length,) = struct.unpack_from('<I', data, 8)
+        offset = 12
+    header = ast.literal_eval(data[offset:offset + header_length].decode('latin1'))
+    if header['descr'] not in _BYTE_DTYPES or header['fortran_order'] or len(header['shape']) != 2:
+        raise ValueError("Scenario must be a 2D C-ordered array of byte unit types!")
+    rows, columns = header['shape']
+    grid = data[offset + header_length:offset + header_length + rows * columns]
+    if len(grid) != rows * columns:
+        raise ValueError("Scenario array is truncated!")
+    return (rows, columns), grid
+
+
+def _check_grid_codes(codes):
+    for code in codes:
+        _check_unit_type(code, allowed=(EMPTY_CELL,))
+    # слой, заполненный нулями, иначе читался бы как карта из одних компаний
+    if EMPTY_CELL not in codes:
+        raise ValueError("Scenario grid has no empty cells!")
+
+
+def _grid_positions(path):
+    numpy = optional_import('numpy')
+    grid = _read_npy(path)
+    positions = {}
+    if numpy is not None:
+        rows, columns = grid.shape
+        counts = numpy.bincount(numpy.asarray(grid).view(numpy.uint8).ravel(), minlength=256)
+        _check_grid_codes(numpy.flatnonzero(counts).tolist())
+        for unit_type in SCENARIO_UNITS:
+            unit_rows, unit_columns = numpy.nonzero(grid == unit_type)
+            positions[unit_type] = (unit_rows.tolist(), unit_columns.tolist())
+    else:
+        (rows, columns), data = grid
+        known_codes = bytes(SCENARIO_UNITS) + bytes([EMPTY_CELL])
+        codes = set(data.translate(None, known_codes))
+        codes.update(code for code in known_codes if bytes([code]) in data)
+        _check_grid_codes(codes)
+        for unit_type in SCENARIO_UNITS:
+            cells = [match.start() for match in re.finditer(re.escape(bytes([unit_type])), data)]
+            positions[unit_type] = ([cell // columns for cell in cells], [cell % columns for cell in cells])
+    return rows, columns, positions
+
+
+def _start_resources(resources):
+    start_resources = dict(DEFAULT_RESOURCES)
+    start_resources.update(resources or {})
+    return start_resources
+
+
+def load_npy(path, resources=None, tile_size=None, previous_map=None) -> list:
+    rows, columns, positions = _grid_positions(path)
+    reset_units(previous_map)
+    resources = _start_resources(resources)
+
+    units = {}
+    for unit_type, unit_class in SCENARIO_UNITS.items():
+        unit_rows, unit_columns = positions[unit_type]
+        resource = resources[unit_type]
+        units[unit_type] = [unit_class.build(row, column, resource)
+                            for row, column in zip(unit_rows, unit_columns)]
+
+    the_map = create_map(rows, columns, tile_size)
+    place_units(the_map,
+                companies=units[UNIT_TYPE['Company']],
+                clients=units[UNIT_TYPE['Client']])
+    return the_map
+
+
+def load_csv(path, rows, columns, resources=None, tile_size=None, previous_map=None) -> list:
+    # строки вида: тип,строка,столбец[,ресурс]; тип - имя или код из UNIT_TYPE
+    resources = _start_resources(resources)
+
+    units = {unit_type: [] for unit_type in SCENARIO_UNITS}
+    # позиции проверяются до reset_units, чтобы ошибка в файле не стёрла предыдущую карту
+    occupied = set()
+    with open(path, newline='') as file:
+        for record in csv.reader(file):
+            if len(record) == 0 or record[0].startswith('#') or record[0].strip() == 'type':
+                continue
+            unit_type = _unit_type(record[0])
+            row, column = int(record[1]), int(record[2])
+            if not (0 <= row < rows and 0 <= column < columns):
+                raise ValueError("Position ({}, {}) is outside the map!".format(row, column))
+            if (row, column) in occupied:
+                raise ValueError("Cell ({}, {}) is already occupied!".format(row, column))
+            occupied.add((row, column))
+            resource = int(record[3]) if len(record) > 3 and record[3].strip() else resources[unit_type]
+            units[unit_type].append(SCENARIO_UNITS[unit_type].build(row, column, resource))
+
+    reset_units(previous_map)
+    the_map = create_map(rows, columns, tile_size)
+    place_units(the_map,
+                companies=units[UNIT_TYPE['Company']],
+                clients=units[UNIT_TYPE['Client']])
+    return the_map
+
+
+def load_scenario(path, rows=None, columns=None, resources=None, tile_size=None, previous_map=None) -> list:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        return load_npy(path, resources, tile_size, previous_map)
+    if extension == '.csv':
+        if rows is None or columns is None:
+            raise ValueError("Map size is required for a .csv scenario!")
+        return load_csv(path, rows, columns, resources, tile_size, previous_map)
+    raise ValueError("Unknown scenario format: {}".format(extension))
+
+
+def save_npy(path, the_map: list):
+    rows = len(the_map)
+    columns = len(the_map[0])
+    header = repr({'descr': '|u1', 'fortran_order': False, 'shape': (rows, columns)}).encode('latin1')
+    # заголовок вместе с сигнатурой выравнивается на 64 байта
+    header += b' ' * (-(len(NPY_MAGIC) + 4 + len(header) + 1) % 64) + b'\n'
+    with open(path, 'wb') as file:
+        file.write(NPY_MAGIC + bytes([1, 0]) + struct.pack('<H', len(header)))
+        file.write(header)
+        file.write(get_type_grid(rows, columns))
@@ -0,0 +1,86 @@
+from .cell import Cell
+from .listeners import UnitListener
+from .units import MapUnit
+
+
+class _MapRow:
+    __slots__ = ('_map', '_row')
+
+    def __init__(self, the_map, row):
+        self._map = the_map
+        self._row = row
+
+    def __len__(self):
+        return self._map.columns
+
+    def __getitem__(self, column):
+        return self._map.get_cell(self._row, column)
+
+
+class ChunkedMap(UnitListener):
+    # карта из квадратных плиток: плитка создаётся при первом обращении
+    # и освобождается в конце хода, если на ней нет юнитов
+    def __init__(self, rows, columns, tile_size=32):
+        self.rows = rows
+        self.columns = columns
+        self.tile_size = tile_size
+        self._tiles = {}
+        self._units_on_tile = {}
+        self._row_views = [_MapRow(self, row) for row in range(rows)]
+        MapUnit.listeners.append(self)
+
+    def close(self):
+        if self in MapUnit.listeners:
+            MapUnit.listeners.remove(self)
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        return self._row_views[row]
+
+    def __iter__(self):
+        return iter(self._row_views)
+
+    @property
+    def allocated_tiles(self):
+        return len(self._tiles)
+
+    def _tile_key(self, row, column):
+        return row // self.tile_size, column // self.tile_size
+
+    def get_cell(self, row, column):
+        if not (0 <= row < self.rows and 0 <= column < self.columns):
+            raise IndexError("Position ({}, {}) is outside the map!".format(row, column))
+        key = (row // self.tile_size, column // self.tile_size)
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = [Cell() for _ in range(self.tile_size * self.tile_size)]
+            self._tiles[key] = tile
+        return tile[(row % self.tile_size) * self.tile_size + column % self.tile_size]
+
+    def _count(self, row, column, change):
+        key = self._tile_key(row, column)
+        count = self._units_on_tile.get(key, 0) + change
+        if count > 0:
+            self._units_on_tile[key] = count
+        else:
+            self._units_on_tile.pop(key, None)
+
+    def on_spawn(self, unit):
+        self._count(unit.row, unit.col, 1)
+
+    def on_move(self, unit, old_position):
+        self._count(old_position[0], old_position[1], -1)
+        self._count(unit.row, unit.col, 1)
+
+    def on_drop(self, unit):
+        self._count(unit.row, unit.col, -1)
+
+    def on_tick_end(self, the_map):
+        self.release_empty_tiles()
+
+    def release_empty_tiles(self):
+        for key in [key for key in self._tiles if self._units_on_tile.get(key, 0) <= 0]:
+            del self._tiles[key]
+            self._units_on_tile.pop(key, None)
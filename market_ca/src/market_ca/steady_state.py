@@ -0,0 +1,222 @@
+import random
+from collections import deque
+
+from .ca_logic import get_unit_type
+from .listeners import UnitListener
+from .units import MapUnit, Company, Product
+
+_MASK = (1 << 64) - 1
+
+SPAWN = 1
+MOVE = 2
+PRODUCE = 3
+BUY = 4
+DROP = 5
+
+
+def _random_state(source):
+    if hasattr(source, 'getstate'):
+        return source.getstate()
+    return source.bit_generator.state
+
+
+def _mix(value):
+    # splitmix64: ключи Зобриста считаются на лету, без таблицы размером с карту
+    value = (value + 0x9e3779b97f4a7c15) & _MASK
+    value = ((value ^ (value >> 30)) * 0xbf58476d1ce4e5b9) & _MASK
+    value = ((value ^ (value >> 27)) * 0x94d049bb133111eb) & _MASK
+    return value ^ (value >> 31)
+
+
+class SteadyStateDetector(UnitListener):
+    def __init__(self, the_map: list, max_period=8, seed=0, random_sources=()):
+        # цикл перематывается, только если за период не было случайных выборов:
+        # кроме модуля random проверяются генераторы из random_sources, например RandomWalkKernel.rng
+        self.columns = len(the_map[0])
+        self.max_period = max_period
+        self.seed = seed
+        self.random_sources = (random,) + tuple(random_sources)
+
+        self.state_hash = 0
+        for units in MapUnit.existing_units:
+            for unit in units:
+                self.state_hash ^= self._cell_key(unit)
+
+        self._tick_signature = 0
+        self._history = deque(maxlen=2 * max_period + 1)
+        self._period = None
+        self._verify_left = 0
+        self._start_fingerprint = None
+        self._start_random_states = None
+        self._start_resources = None
+        self._min_resources = None
+        self.cycle = None
+        self.skipped_ticks = 0
+
+        MapUnit.listeners.append(self)
+
+    def close(self):
+        if self in MapUnit.listeners:
+            MapUnit.listeners.remove(self)
+
+    def _cell_key(self, unit, row=None, column=None):
+        row = unit.row if row is None else row
+        column = unit.col if column is None else column
+        return _mix(((row * self.columns + column) << 2 | get_unit_type(unit)) ^ self.seed)
+
+    def _event_key(self, *values):
+        key = self.seed
+        for value in values:
+            key = _mix(key ^ value)
+        return key
+
+    def _add_event(self, *values):
+        self._tick_signature = (self._tick_signature + self._event_key(*values)) & _MASK
+
+    def on_spawn(self, unit):
+        self.state_hash ^= self._cell_key(unit)
+        self._add_event(SPAWN, get_unit_type(unit), unit.row, unit.col)
+
+    def on_move(self, unit, old_position):
+        old_row, old_column = old_position
+        self.state_hash ^= self._cell_key(unit, old_row, old_column) ^ self._cell_key(unit)
+        self._add_event(MOVE, old_row, old_column, unit.row, unit.col)
+
+    def on_produce(self, company, product):
+        self._add_event(PRODUCE, company.row, company.col, product.row, product.col)
+
+    def on_buy(self, client, product):
+        self._add_event(BUY, client.row, client.col, product.row, product.col)
+
+    def on_drop(self, unit):
+        self.state_hash ^= self._cell_key(unit)
+        self._add_event(DROP, get_unit_type(unit), unit.row, unit.col)
+
+    def on_tick_end(self, the_map):
+        self._history.append((self.state_hash, self._tick_signature))
+        self._tick_signature = 0
+
+        if self._period is not None:
+            self._verify_tick()
+        elif self.cycle is None:
+            period = self._find_period()
+            if period is not None:
+                self._start_verification(period)
+        elif self._find_period() != self.cycle[0]:
+            self._reset()
+
+    def _find_period(self):
+        history = self._history
+        for period in range(1, self.max_period + 1):
+            if len(history) < 2 * period + 1:
+                break
+            if all(history[-1 - shift] == history[-1 - shift - period] for shift in range(period + 1)):
+                return period
+        return None
+
+    @staticmethod
+    def _units():
+        return [unit for units in MapUnit.existing_units for unit in units]
+
+    @staticmethod
+    def _fingerprint(units):
+        # всё состояние юнитов, кроме ресурса, и поле спроса, от которого зависят их ходы
+        fingerprint = []
+        for unit in units:
+            state = (get_unit_type(unit), unit.row, unit.col)
+            if isinstance(unit, Company):
+                state += (unit.sale_points.state(),)
+            elif isinstance(unit, Product):
+                state += (unit.direction, tuple(unit.path.elements))
+            fingerprint.append(state)
+        if MapUnit.demand_field is not None:
+            fingerprint.append(MapUnit.demand_field.state())
+        return fingerprint
+
+    def _random_states(self):
+        return [_random_state(source) for source in self.random_sources]
+
+    def _start_verification(self, period):
+        units = self._units()
+        self._period = period
+        self._verify_left = period
+        self._start_fingerprint = self._fingerprint(units)
+        self._start_random_states = self._random_states()
+        self._start_resources = [unit.resource for unit in units]
+        self._min_resources = [0] * len(units)
+
+    def _verify_tick(self):
+        units = self._units()
+        if len(units) != len(self._start_resources):
+            self._reset()
+            return
+        for index, unit in enumerate(units):
+            dip = unit.resource - self._start_resources[index]
+            if dip < self._min_resources[index]:
+                self._min_resources[index] = dip
+
+        self._verify_left -= 1
+        if self._verify_left == 0:
+            self._finish_verification(units)
+
+    def _finish_verification(self, units):
+        period = self._period
+        if (self._fingerprint(units) != self._start_fingerprint or self._find_period() != period
+                or self._random_states() != self._start_random_states):
+            self._reset()
+            return
+        deltas = [unit.resource - start for unit, start in zip(units, self._start_resources)]
+        self.cycle = (period, deltas, self._min_resources)
+        self._period = None
+
+    def _reset(self):
+        self._period = None
+        self._verify_left = 0
+        self._start_fingerprint = None
+        self._start_random_states = None
+        self._start_resources = None
+        self._min_resources = None
+        self.cycle = None
+
+    def periods_to_next_drop(self):
+        if self.cycle is None:
+            return None
+        period, deltas, dips = self.cycle
+        units = self._units()
+        periods = None
+        for unit, delta, dip in zip(units, deltas, dips):
+            if delta == 0:
+                continue
+            if isinstance(unit, Product):
+                # путь продукта зависит от его ресурса, перемотка была бы неточной
+                return 0
+            if delta > 0:
+                continue
+            margin = unit.resource + dip
+            unit_periods = (margin - 1) // -delta + 1 if margin > 0 else 0
+            if periods is None or unit_periods < periods:
+                periods = unit_periods
+        return periods
+
+    def status(self):
+        if self.cycle is not None and self.periods_to_next_drop() is None:
+            return 'Рынок пришёл в стационарное состояние'
+        return None
+
+    def fast_forward(self, max_ticks=None) -> int:
+        periods = self.periods_to_next_drop()
+        if not periods:
+            return 0
+        period, deltas, _ = self.cycle
+        if max_ticks is not None:
+            periods = min(periods, max_ticks // period)
+            if periods <= 0:
+                return 0
+        for unit, delta in zip(self._units(), deltas):
+            unit.resource += periods * delta
+        self._history.clear()
+        self._reset()
+        self.skipped_ticks += periods * period
+        for listener in MapUnit.listeners:
+            listener.on_fast_forward(periods * period)
+        return periods * period
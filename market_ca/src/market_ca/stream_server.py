@@ -0,0 +1,186 @@
+import asyncio
+import json
+import socket
+import struct
+import zlib
+
+from .ca_logic import UNIT_COLOR, play_tick
+from .live_state import TypeGridTracker, _unit_counts
+
+PALETTE = ord('P')
+KEYFRAME = ord('K')
+DELTA = ord('D')
+
+# длина кадра и его вид; внутри сжатого кадра: ход и число юнитов каждого типа
+_FRAME_HEADER = struct.Struct('!IB')
+_STATE = struct.Struct('!QIII')
+_CHANGE = struct.Struct('!IB')
+
+
+def get_palette():
+    return dict(UNIT_COLOR)
+
+
+def _frame(kind, payload: bytes) -> bytes:
+    return _FRAME_HEADER.pack(len(payload) + 1, kind) + payload
+
+
+class _Subscriber:
+    __slots__ = ('queue', 'task')
+
+    def __init__(self, max_pending):
+        self.queue = asyncio.Queue(max_pending)
+        self.task = None
+
+
+class MarketStreamServer(TypeGridTracker):
+    # рассылает подписчикам изменённые клетки каждого хода и периодически всю сетку;
+    # отставший подписчик теряет накопленные кадры и получает последнюю сетку
+    def __init__(self, the_map: list, host='127.0.0.1', port=0, keyframe_interval=50,
+                 max_pending=16, send_buffer=32 * 1024, compress_level=1):
+        super().__init__(the_map)
+        self.host = host
+        self.port = port
+        self.keyframe_interval = keyframe_interval
+        self.max_pending = max_pending
+        self.send_buffer = send_buffer
+        self.compress_level = compress_level
+        self.tick = 0
+        self.dropped_frames = 0
+
+        self._server = None
+        self._subscribers = set()
+        self._keyframe = None
+        self._palette = _frame(PALETTE, json.dumps(get_palette()).encode())
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._subscribe, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        super().close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for subscriber in list(self._subscribers):
+            subscriber.task.cancel()
+        self._subscribers.clear()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    def _state(self):
+        return _STATE.pack(self.tick, *_unit_counts())
+
+    def _get_keyframe(self):
+        if self._keyframe is None:
+            payload = zlib.compress(self._state() + bytes(self.grid), self.compress_level)
+            self._keyframe = _frame(KEYFRAME, payload)
+        return self._keyframe
+
+    def _get_delta(self, dirty):
+        changes = bytearray(self._state())
+        grid = self.grid
+        for index in sorted(dirty):
+            changes += _CHANGE.pack(index, grid[index])
+        return _frame(DELTA, zlib.compress(changes, self.compress_level))
+
+    def on_fast_forward(self, ticks):
+        self.tick += ticks
+
+    def on_tick_end(self, the_map):
+        self.tick += 1
+        dirty = self.take_dirty()
+        self._keyframe = None
+        if len(self._subscribers) == 0:
+            return
+        if self.tick % self.keyframe_interval == 0:
+            frame = self._get_keyframe()
+        else:
+            frame = self._get_delta(dirty)
+        for subscriber in self._subscribers:
+            self._send(subscriber, frame)
+
+    def _send(self, subscriber, frame):
+        queue = subscriber.queue
+        if not queue.full():
+            queue.put_nowait(frame)
+            return
+        while not queue.empty():
+            queue.get_nowait()
+            self.dropped_frames += 1
+        queue.put_nowait(self._get_keyframe())
+
+    async def _subscribe(self, reader, writer):
+        subscriber = _Subscriber(self.max_pending)
+        subscriber.task = asyncio.current_task()
+        self._subscribers.add(subscriber)
+        # иначе кадры копятся в буферах сокета и отставание подписчика не ограничено
+        writer.transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                                                              self.send_buffer)
+        writer.transport.set_write_buffer_limits(high=self.send_buffer)
+        try:
+            writer.write(self._palette)
+            writer.write(self._get_keyframe())
+            while True:
+                frame = await subscriber.queue.get()
+                writer.write(frame)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._subscribers.discard(subscriber)
+            writer.close()
+
+    async def run_game(self, the_map: list, max_iterations, tick_delay=0.0,
+                       detector=None, planner=None, random_walk=None):
+        # ca_logic.run_game с передачей управления подписчикам между ходами
+        iteration = 0
+        while iteration < max_iterations:
+            ticks, game_status = play_tick(the_map, max_iterations - iteration, detector, planner, random_walk)
+            if game_status is not None:
+                return iteration, game_status
+            iteration += ticks
+            await asyncio.sleep(tick_delay)
+        return iteration, None
+
+
+class StreamDecoder:
+    # восстанавливает сетку на стороне подписчика
+    def __init__(self):
+        self.palette = None
+        self.grid = None
+        self.tick = None
+        self.counts = None
+
+    def apply(self, kind, payload):
+        if kind == PALETTE:
+            self.palette = {int(unit_type): color for unit_type, color in json.loads(payload).items()}
+            return
+        data = zlib.decompress(payload)
+        self.tick, *counts = _STATE.unpack_from(data, 0)
+        self.counts = tuple(counts)
+        if kind == KEYFRAME:
+            self.grid = bytearray(data[_STATE.size:])
+        elif self.grid is not None:
+            for index, unit_type in _CHANGE.iter_unpack(data[_STATE.size:]):
+                self.grid[index] = unit_type
+
+
+async def read_frames(reader):
+    while True:
+        try:
+            header = await reader.readexactly(_FRAME_HEADER.size)
+        except asyncio.IncompleteReadError:
+            return
+        length, kind = _FRAME_HEADER.unpack(header)
+        yield kind, await reader.readexactly(length - 1)
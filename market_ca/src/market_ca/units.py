@@ -3,7 +3,15 @@ from collections import namedtuple
 from math import sqrt
 import random
 
-from src.market_ca.queues import Queue, PriorityQueue
+from .queues import Queue, PriorityQueue, DemandQueue
+
+
+def choose(options):
+    # вынужденный выбор не тратит случайные числа, поэтому перемотку
+    # стационарных участков не видно в дальнейшей последовательности random
+    if len(options) == 1:
+        return options[0]
+    return random.choice(options)
 
 
 class MapUnit(ABC):
@@ -12,6 +20,10 @@ class MapUnit(ABC):
                                  products=[],
                                  clients=[])
     RADIUS_VIEW = 1
+    listeners = []
+    density = None
+    demand_field = None
+    __slots__ = ('row', 'col', 'resource')
 
     @abstractmethod
     def __init__(self, row, column, resource):
@@ -19,12 +31,28 @@ class MapUnit(ABC):
         self.col = column
         self.resource = resource
 
+    @classmethod
+    def build(cls, row, column, resource):
+        # без __init__: юнит не попадает в реестр и не оповещает слушателей,
+        # такие юниты регистрируются пачкой через ca_logic.place_units
+        unit = cls.__new__(cls)
+        unit.row = row
+        unit.col = column
+        unit.resource = resource
+        unit._init_fields()
+        return unit
+
+    def _init_fields(self):
+        pass
+
     @abstractmethod
     def drop_unit(self, the_map):
         raise NotImplementedError
 
     def get_passable_pos(self, the_map: list, current_pos: tuple):
-        visible_pos = self._get_visible_pos(len(the_map) - 1, len(the_map[0]) - 1, current_pos)
+        rows = len(the_map) - 1
+        cols = len(the_map[0]) - 1
+        visible_pos = self._get_visible_pos(rows, cols, current_pos)
         return self._get_free_pos(the_map, visible_pos)
 
     @staticmethod
@@ -37,11 +65,9 @@ class MapUnit(ABC):
                 free_pos.append(coord)
         return free_pos
 
-    def _get_visible_pos(self, rows, cols, current_pos) -> list:
+    def _get_visible_bounds(self, rows, cols, current_pos) -> tuple:
         current_row, current_column = current_pos
 
-        visible_pos = []
-
         dif_row = current_row - self.RADIUS_VIEW
         sum_row = current_row + self.RADIUS_VIEW
 
@@ -54,6 +80,13 @@ class MapUnit(ABC):
         start_col = dif_col if dif_col >= 0 else current_column
         end_col = sum_col if sum_col <= cols else current_column
 
+        return start_row, end_row, start_col, end_col
+
+    def _get_visible_pos(self, rows, cols, current_pos) -> list:
+        current_row, current_column = current_pos
+        start_row, end_row, start_col, end_col = self._get_visible_bounds(rows, cols, current_pos)
+
+        visible_pos = []
         for row in range(start_row, end_row + 1):
             for column in range(start_col, end_col + 1):
                 if row == current_row and column == current_column:
@@ -61,10 +94,13 @@ class MapUnit(ABC):
                 visible_pos.append((row, column))
         return visible_pos
 
-    def get_path(self, the_map, start_pos, goal_pos, resource=None):
+    def get_path(self, the_map, start_pos, goal_pos, resource=None, path=None):
         came_from = self._a_star_search(the_map, start_pos, goal_pos, resource)
         reconstructed_path = self._reconstruct_path(came_from, start_pos, goal_pos)
-        path = Queue()
+        if path is None:
+            path = Queue()
+        else:
+            path.reset()
         if reconstructed_path is not None:
             for path_pos in reconstructed_path:
                 path.put(path_pos)
@@ -126,14 +162,26 @@ class MapUnit(ABC):
 
 
 class Company(MapUnit):
+    __slots__ = ('company_products', 'sale_points', 'planned_route')
+    PRODUCT_RESOURCE = 20
+    # дальше этого продукт не дойдёт, такие точки продаж не рассматриваются
+    SALE_POINT_DISTANCE = PRODUCT_RESOURCE // 5
 
     def __init__(self, row, col, resource):
         super().__init__(row, col, resource)
         self.existing_units.companies.append(self)
+        self._init_fields()
+        for listener in self.listeners:
+            listener.on_spawn(self)
+
+    def _init_fields(self):
         self.company_products = []
-        self.sale_points = Queue()
+        self.sale_points = DemandQueue()
+        self.planned_route = None
 
     def drop_unit(self, the_map):
+        for listener in self.listeners:
+            listener.on_drop(self)
         the_map[self.row][self.col].unit = None
         self._drop_products(the_map)
         self.existing_units.companies.remove(self)
@@ -148,52 +196,105 @@ class Company(MapUnit):
 
         passable_pos = self.get_passable_pos(the_map, (self.row, self.col))
         if len(passable_pos) <= 0:
+            self.planned_route = None
+            return None
+
+        if self.demand_field is not None:  # направление задаёт поле спроса, а не точки продаж
+            self.produce_product(the_map, choose(self.demand_field.best_positions(passable_pos)))
             return None
 
-        if not self.sale_points.empty():
-            direction = self.sale_points.get()
-            path = self.get_path(the_map, (self.row, self.col), direction, 20)
-            if not path.empty():
-                start_position = path.get()
-                self.produce_product(the_map, start_position, direction, path)
-                produced_products += 1
+        path = None
+        if self.planned_route is not None:  # путь искал заранее планировщик
+            direction, path = self.planned_route
+            self.planned_route = None
+            if path is not None and not path.empty():
+                row, column = path.elements[0]
+                if the_map[row][column].unit is not None:
+                    path = None
+        else:
+            direction = self.next_sale_point()
+        if direction is not None and path is None:
+            path = self.get_path(the_map, (self.row, self.col), direction, self.PRODUCT_RESOURCE)
+        if path is not None and not path.empty():
+            start_position = path.get()
+            self.produce_product(the_map, start_position, direction, path)
+            produced_products += 1
 
         if produced_products == 0:
-            self.produce_product(the_map, random.choice(passable_pos))
+            self.produce_product(the_map, choose(passable_pos))
+
+    def next_sale_point(self):
+        self.sale_points.age_out()
+        if self.sale_points.empty():
+            return None
+        return self.sale_points.get((self.row, self.col), self.SALE_POINT_DISTANCE)
 
     def produce_product(self, the_map, position, direction=None, path=None):
         row, column = position
         new_cell = the_map[row][column]
-        product = Product(row=row,
-                          col=column,
-                          resource=20,
-                          company=self)
+        product = Product.create(row=row,
+                                 col=column,
+                                 resource=self.PRODUCT_RESOURCE,
+                                 company=self)
         new_cell.unit = product
         self.company_products.append(product)
         self.resource -= new_cell.PRICE_PER_MOVE
         if direction is not None:
             product.set_direction(direction)
         if path is not None:
-            product.path = path
+            product.path.elements.extend(path.elements)
+        for listener in self.listeners:
+            listener.on_produce(self, product)
 
 
 class Product(MapUnit):
+    __slots__ = ('company', 'direction', 'path', 'path_planned')
+    # проданные и исчезнувшие продукты переиспользуются вместе с очередью пути
+    free_products = []
 
     def __init__(self, row, col, resource, company):
         super().__init__(row, col, resource)
         # self.quality: int
         # self.eco_friendly: int
         # self.price: int
+        self._init_fields()
         self.company = company
+        self._register()
+
+    def _init_fields(self):
+        self.company = None
         self.direction = None
         self.path = Queue()
+        self.path_planned = False
+
+    @classmethod
+    def create(cls, row, col, resource, company):
+        if not cls.free_products:
+            return cls(row, col, resource, company)
+        product = cls.free_products.pop()
+        product.row = row
+        product.col = col
+        product.resource = resource
+        product.company = company
+        product._register()
+        return product
+
+    def _register(self):
         self.existing_units.products.append(self)
+        for listener in self.listeners:
+            listener.on_spawn(self)
 
     def drop_unit(self, the_map):
+        for listener in self.listeners:
+            listener.on_drop(self)
         the_map[self.row][self.col].unit = None
         self.company.company_products.remove(self)
         self.existing_units.products.remove(self)
-        del self
+        self.company = None
+        self.direction = None
+        self.path.reset()
+        self.path_planned = False
+        self.free_products.append(self)
 
     def set_direction(self, direction):
         self.direction = direction
@@ -203,28 +304,34 @@ class Product(MapUnit):
 
     def do_action(self, the_map):
         new_position = None
+        # путь уже искал планировщик на этом ходу, даже если не нашёл
+        path_planned = self.path_planned
+        self.path_planned = False
         # TODO 3 блока кода как отдельные функции - нужен рефакторинг
         if self.direction is not None:
             if (self.row, self.col) == self.direction:
                 self.unset_direction()
             else:
-                if self.path.empty():
-                    self.path = self.get_path(the_map, (self.row, self.col), self.direction, self.resource)
+                if self.path.empty() and not path_planned:
+                    self.get_path(the_map, (self.row, self.col), self.direction, self.resource, self.path)
                 if not self.path.empty():
                     new_position = self.path.get()
 
         if new_position is not None:
             row, column = new_position
             if the_map[row][column].unit is not None:  # обработка препятствий
-                self.path.reset()
-                self.path = self.get_path(the_map, (self.row, self.col), self.direction, self.resource)
+                self.get_path(the_map, (self.row, self.col), self.direction, self.resource, self.path)
                 if not self.path.empty():
                     new_position = self.path.get()
+                else:
+                    new_position = None
 
         if new_position is None:  # случайное перемещение
             passable_pos = self.get_passable_pos(the_map, (self.row, self.col))
             if len(passable_pos) > 0:
-                new_position = random.choice(passable_pos)
+                if self.demand_field is not None:
+                    passable_pos = self.demand_field.best_positions(passable_pos)
+                new_position = choose(passable_pos)
 
         if new_position is not None:
             self.move(the_map, new_position)
@@ -234,30 +341,47 @@ class Product(MapUnit):
         new_cell = the_map[row][column]
         new_cell.unit = self
         the_map[self.row][self.col].unit = None
+        old_position = (self.row, self.col)
         self.row = row
         self.col = column
         self.resource -= new_cell.PRICE_PER_MOVE
+        for listener in self.listeners:
+            listener.on_move(self, old_position)
 
 
 class Client(MapUnit):
+    __slots__ = ()
+    PRODUCT_PRICE = 7  # TODO заглушка
+
     def __init__(self, row, col, resource):
         super().__init__(row, col, resource)
         self.existing_units.clients.append(self)
+        for listener in self.listeners:
+            listener.on_spawn(self)
 
     def drop_unit(self, the_map):
+        for listener in self.listeners:
+            listener.on_drop(self)
         the_map[self.row][self.col].unit = None
         self.existing_units.clients.remove(self)
         del self
 
     def buy_product(self, the_map):
-        visible_pos = self._get_visible_pos(len(the_map) - 1, len(the_map[0]) - 1, (self.row, self.col))
+        rows = len(the_map) - 1
+        cols = len(the_map[0]) - 1
+        if self.density is not None:
+            if not self.density.has_products(self._get_visible_bounds(rows, cols, (self.row, self.col))):
+                return None
+        visible_pos = self._get_visible_pos(rows, cols, (self.row, self.col))
         found_products = self._get_products(the_map, visible_pos)
 
         if len(found_products) > 0:
-            selected_product = random.choice(found_products)
-            selected_product.company.resource += 7  # TODO заглушка
+            selected_product = choose(found_products)
+            selected_product.company.resource += self.PRODUCT_PRICE
             selected_product.company.sale_points.put((selected_product.row, selected_product.col))
-            self.resource -= 7
+            self.resource -= self.PRODUCT_PRICE
+            for listener in self.listeners:
+                listener.on_buy(self, selected_product)
             selected_product.drop_unit(the_map)
 
     @staticmethod
@@ -3,11 +3,10 @@ from random import randint
 
 from PySide6.QtWidgets import QApplication, QMainWindow, QTableWidgetItem
 from PySide6.QtGui import QColor
-from PySide6.QtTest import QTest
 
-from src.ui.ui_main_window import Ui_MainWindow
+from ui.ui_main_window import Ui_MainWindow
 
-import src.market_ca.ca_logic as ca_logic
+import market_ca.ca_logic as ca_logic
 
 speed_rate = {1: 400, 2: 300, 3: 200, 4: 100}
 
@@ -101,6 +100,8 @@ class MainWindow(QMainWindow):
         return True
 
     def start_game(self):
+        from PySide6.QtTest import QTest
+
         self.__change_ui_elements_status(False)
 
         self.IS_RUNNING = True
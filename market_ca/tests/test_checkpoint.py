@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+import market_ca.ca_logic as ca_logic
+from market_ca.checkpoint import Checkpoint, save_checkpoint, restore_checkpoint
+
+
+@pytest.fixture
+def market():
+    ca_logic.MapUnit.listeners.clear()
+    ca_logic.reset_units()
+    random.seed(3)
+    the_map = ca_logic.create_map(20, 20)
+    ca_logic.generate_units(ca_logic.UNIT_TYPE['Company'], the_map, 10, 20, 20)
+    ca_logic.generate_units(ca_logic.UNIT_TYPE['Client'], the_map, 40, 20, 20)
+    ca_logic.run_game(the_map, 10)
+    yield the_map
+    ca_logic.reset_units()
+
+
+def _units():
+    return [[(unit.row, unit.col, unit.resource) for unit in units] for units in ca_logic.MapUnit.existing_units]
+
+
+def _continue(the_map):
+    iterations, status = ca_logic.run_game(the_map, 20)
+    return iterations, status, _units(), random.getstate()
+
+
+def test_restore_continues_like_the_saved_game(market, tmp_path):
+    path = tmp_path / 'market.ckpt'
+    save_checkpoint(path, market)
+    expected = _continue(market)
+
+    the_map = restore_checkpoint(path, previous_map=market)
+    assert _continue(the_map) == expected
+
+
+def test_truncated_checkpoint_is_rejected_before_restore(market, tmp_path):
+    path = tmp_path / 'market.ckpt'
+    save_checkpoint(path, market)
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) - 3000])
+
+    units = _units()
+    with pytest.raises(ValueError):
+        restore_checkpoint(path, restore_random_state=False, previous_map=market)
+    with pytest.raises(ValueError):
+        Checkpoint(path)
+    assert _units() == units
+
+
+def test_product_without_company_is_not_saved(market, tmp_path):
+    ca_logic.MapUnit.existing_units.products.append(ca_logic.get_unit(ca_logic.UNIT_TYPE['Product'], 0, 0))
+    with pytest.raises(ValueError):
+        save_checkpoint(tmp_path / 'market.ckpt', market)
+    ca_logic.MapUnit.existing_units.products.pop()
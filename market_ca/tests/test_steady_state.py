@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+import market_ca.ca_logic as ca_logic
+from market_ca.demand_field import DemandField
+from market_ca.steady_state import SteadyStateDetector
+
+# с начальными значениями по умолчанию клиенты разоряются раньше, чем цикл подтверждается
+START_RESOURCE = 400
+TICKS = 300
+
+
+@pytest.fixture(autouse=True)
+def rich_market(monkeypatch):
+    monkeypatch.setattr(ca_logic, 'COMPANY_START_RESOURCE', START_RESOURCE)
+    monkeypatch.setattr(ca_logic, 'CLIENT_START_RESOURCE', START_RESOURCE)
+    yield
+    ca_logic.MapUnit.listeners.clear()
+    ca_logic.MapUnit.demand_field = None
+    ca_logic.reset_units()
+
+
+def _play(size, seed, with_detector, demand_field=False):
+    ca_logic.MapUnit.listeners.clear()
+    ca_logic.reset_units()
+    random.seed(seed)
+    the_map = ca_logic.create_map(size, size)
+    ca_logic.generate_units(ca_logic.UNIT_TYPE['Company'], the_map, 10, size, size)
+    ca_logic.generate_units(ca_logic.UNIT_TYPE['Client'], the_map, 30, size, size)
+
+    field = DemandField(the_map, use_numpy=False) if demand_field else None
+    detector = SteadyStateDetector(the_map) if with_detector else None
+    iterations, status = ca_logic.run_game(the_map, TICKS, detector=detector)
+    if field is not None:
+        field.close()
+    units = sorted((ca_logic.get_unit_type(unit), unit.row, unit.col, unit.resource)
+                   for units in ca_logic.MapUnit.existing_units for unit in units)
+    skipped = detector.skipped_ticks if detector is not None else 0
+    return (iterations, status, units, random.getstate()), skipped
+
+
+@pytest.mark.parametrize('size', [4, 6, 10])
+def test_fast_forward_matches_full_run(size):
+    jumps = 0
+    for seed in range(12):
+        expected, _ = _play(size, seed, with_detector=False)
+        actual, skipped = _play(size, seed, with_detector=True)
+        assert actual == expected, 'seed {}'.format(seed)
+        jumps += skipped > 0
+    assert jumps > 0
+
+
+@pytest.mark.parametrize('size, seed', [(4, 77), (6, 14)])
+def test_cycle_with_random_choice_is_not_skipped(size, seed):
+    # здесь цикл повторяется лишь потому, что случайный выбор совпал
+    expected, _ = _play(size, seed, with_detector=False)
+    actual, _ = _play(size, seed, with_detector=True)
+    assert actual == expected
+
+
+@pytest.mark.parametrize('size', [4, 6, 8])
+def test_fast_forward_with_demand_field(size):
+    # поле спроса затухает и в цикле не повторяется, хотя юниты повторяются
+    for seed in range(15):
+        expected, _ = _play(size, seed, with_detector=False, demand_field=True)
+        actual, _ = _play(size, seed, with_detector=True, demand_field=True)
+        assert actual == expected, 'seed {}'.format(seed)
+
+
+def test_metrics_follow_fast_forward():
+    from market_ca.metrics import MarketMetrics
+
+    jumps = 0
+    for seed in range(12):
+        ca_logic.MapUnit.listeners.clear()
+        ca_logic.reset_units()
+        random.seed(seed)
+        the_map = ca_logic.create_map(6, 6)
+        ca_logic.generate_units(ca_logic.UNIT_TYPE['Company'], the_map, 10, 6, 6)
+        ca_logic.generate_units(ca_logic.UNIT_TYPE['Client'], the_map, 30, 6, 6)
+        metrics = MarketMetrics()
+        detector = SteadyStateDetector(the_map)
+
+        iterations, _ = ca_logic.run_game(the_map, TICKS, detector=detector)
+        jumps += detector.skipped_ticks > 0
+        assert metrics.tick == iterations
+        assert metrics.company_resources == sum(company.resource
+                                                for company in ca_logic.MapUnit.existing_units.companies)
+    assert jumps > 0